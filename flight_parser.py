@@ -12,9 +12,20 @@ Usage examples:
 import argparse      #for reading command-line arguments
 import csv           #\
 import json           #for file handling (CSV files, JSON files, paths).
+import math
 import os            #/
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+try:
+    import orjson    #faster JSON encode/decode when available
+except ImportError:
+    orjson = None
 
 STUDENT_ID = "231ADB279"      
 STUDENT_NAME = "Aysel"        
@@ -22,21 +33,114 @@ STUDENT_LASTNAME = "Abiyeva"
 
 DEFAULT_DB_JSON = "db.json"
 ERRORS_TXT = "errors.txt"
+READ_BUFFER_SIZE = 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
 
 DATETIME_FORMAT = "%Y-%m-%d %H:%M"
 
+#Parsed datetimes are cached in the JSON DB as whole minutes since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+ONE_MINUTE = timedelta(minutes=1)
+
 #Validation Functions
 
+FLIGHT_ID_RE = re.compile(r"[A-Za-z0-9]{2,8}\Z")
+AIRPORT_CODE_RE = re.compile(r"[A-Z]{3}\Z")    # 3 uppercase letters
+
+
 def is_valid_flight_id(value: str) -> bool:
-    return value.isalnum() and 2 <= len(value) <= 8
+    return FLIGHT_ID_RE.match(value) is not None
 
 
 def is_valid_airport_code(value: str) -> bool:
-    # 3 uppercase letters
-    return len(value) == 3 and value.isalpha() and value.isupper()
+    return AIRPORT_CODE_RE.match(value) is not None
+
+
+#Bit flags for every row validation failure, so the common (valid) case
+#is one integer test and the messages are only built for bad rows.
+#REASON_MSGS is in the order the reasons are reported.
+
+REASON_FIELD_COUNT = 1 << 0
+REASON_FID_MISSING = 1 << 1
+REASON_FID_TOO_LONG = 1 << 2
+REASON_FID_FORMAT = 1 << 3
+REASON_ORIGIN_MISSING = 1 << 4
+REASON_ORIGIN_CODE = 1 << 5
+REASON_DEST_MISSING = 1 << 6
+REASON_DEST_CODE = 1 << 7
+REASON_DATE_FORMAT = 1 << 8
+REASON_DEP_DATETIME = 1 << 9
+REASON_ARR_DATETIME = 1 << 10
+REASON_ARR_BEFORE_DEP = 1 << 11
+REASON_PRICE_VALUE = 1 << 12
+REASON_PRICE_NEGATIVE = 1 << 13
+REASON_PRICE_ZERO = 1 << 14
+
+REASON_MSGS = (
+    (REASON_FIELD_COUNT, "missing required fields"),
+    (REASON_FID_MISSING, "missing flight_id field"),
+    (REASON_FID_TOO_LONG, "flight_id too long (more than 8 characters)"),
+    (REASON_FID_FORMAT, "invalid flight_id format"),
+    (REASON_ORIGIN_MISSING, "missing origin field"),
+    (REASON_ORIGIN_CODE, "invalid origin code"),
+    (REASON_DEST_MISSING, "missing destination field"),
+    (REASON_DEST_CODE, "invalid destination code"),
+    (REASON_DATE_FORMAT, "invalid date format"),
+    (REASON_DEP_DATETIME, "invalid departure datetime"),
+    (REASON_ARR_DATETIME, "invalid arrival datetime"),
+    (REASON_ARR_BEFORE_DEP, "arrival before departure"),
+    (REASON_PRICE_VALUE, "invalid price value"),
+    (REASON_PRICE_NEGATIVE, "negative price value"),
+    (REASON_PRICE_ZERO, "price must be positive"),
+)
+
+
+def reasons_message(line_no: int, original_line: str, reasons_bits: int) -> str:
+    reasons = [msg for bit, msg in REASON_MSGS if reasons_bits & bit]
+    return f"Line {line_no}: {original_line} \u2192 {', '.join(reasons)}"
+
+
+def check_codes(flight_id: str, origin: str, destination: str) -> int:
+    bits = 0
+
+    # Flight ID
+    if not flight_id:
+        bits |= REASON_FID_MISSING
+    elif not is_valid_flight_id(flight_id):
+        bits |= REASON_FID_TOO_LONG if len(flight_id) > 8 else REASON_FID_FORMAT
+
+    # Origin
+    if not origin:
+        bits |= REASON_ORIGIN_MISSING
+    elif not is_valid_airport_code(origin):
+        bits |= REASON_ORIGIN_CODE
+
+    # Destination
+    if not destination:
+        bits |= REASON_DEST_MISSING
+    elif not is_valid_airport_code(destination):
+        bits |= REASON_DEST_CODE
+
+    return bits
+
+
+def has_datetime_shape(value: str) -> bool:
+    # Fixed-width "YYYY-MM-DD HH:MM" with ASCII digits (the values may still be out of range)
+    if len(value) != 16 or value[4] != "-" or value[7] != "-" or value[10] != " " or value[13] != ":":
+        return False
+    digits = value[:4] + value[5:7] + value[8:10] + value[11:13] + value[14:]
+    return digits.isascii() and digits.isdigit()
 
 
 def parse_datetime(value: str) -> Optional[datetime]:
+    # Fast path: slice the fixed-width "YYYY-MM-DD HH:MM" form directly,
+    # anything else goes through strptime as before
+    if has_datetime_shape(value):
+        try:
+            return datetime(int(value[:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), int(value[14:]))
+        except ValueError:
+            return None
     try:
         return datetime.strptime(value, DATETIME_FORMAT)
     except ValueError:
@@ -44,103 +148,167 @@ def parse_datetime(value: str) -> Optional[datetime]:
 
 
 def parse_price(value: str) -> Optional[float]:
+    # nan/inf are not prices (and orjson cannot write them back to JSON)
     try:
-        return float(value)
+        price = float(value)
     except ValueError:
         return None
+    return price if math.isfinite(price) else None
+
+
+#  FLIGHT RECORD
+#  Compact in-memory form of one flight: the original text fields plus the
+#  datetimes parsed once. Dicts are only used at the JSON boundary.
+
+@dataclass(slots=True)
+class Flight:
+    flight_id: str
+    origin: str
+    destination: str
+    departure_datetime: str
+    arrival_datetime: str
+    price: float
+    dep_dt: datetime
+    arr_dt: datetime
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "flight_id": self.flight_id,
+            "origin": self.origin,
+            "destination": self.destination,
+            "departure_datetime": self.departure_datetime,
+            "arrival_datetime": self.arrival_datetime,
+            "price": self.price,
+        }
+
+    def to_db_dict(self) -> Dict[str, Any]:
+        # to_dict() plus the parsed datetimes, so loading the DB skips parsing.
+        # When present, the _*_epoch_min values are authoritative for queries:
+        # after editing a datetime string in db.json by hand, delete them too.
+        data = self.to_dict()
+        data["_dep_epoch_min"] = (self.dep_dt - EPOCH) // ONE_MINUTE
+        data["_arr_epoch_min"] = (self.arr_dt - EPOCH) // ONE_MINUTE
+        return data
 
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "Flight":
+        # item must already have passed check_flight_record;
+        # files written before the _*_epoch_min cache existed are parsed instead
+        dep_min = item.get("_dep_epoch_min")
+        arr_min = item.get("_arr_epoch_min")
+        return cls(
+            flight_id=sys.intern(item["flight_id"]),
+            origin=sys.intern(item["origin"]),
+            destination=sys.intern(item["destination"]),
+            departure_datetime=item["departure_datetime"],
+            arrival_datetime=item["arrival_datetime"],
+            price=item["price"],
+            dep_dt=EPOCH + timedelta(minutes=dep_min) if dep_min is not None else parse_datetime(item["departure_datetime"]),
+            arr_dt=EPOCH + timedelta(minutes=arr_min) if arr_min is not None else parse_datetime(item["arrival_datetime"]),
+        )
 
 
 #  CORE: CSV PARSING / VALIDATE
 
 
-def validate_row(fields: List[str], line_no: int, original_line: str) -> Tuple[bool, Optional[Dict[str, Any]], str]:
+def validate_row(fields: List[str], line_no: int, original_line: str) -> Tuple[bool, Optional[Flight], str]:
     """
     Validate a single CSV row.
     Returns:
-      (is_valid, flight_dict_or_None, error_message_if_invalid)
+      (is_valid, flight_or_None, error_message_if_invalid)
     """
-    reasons: List[str] = []
-
     if len(fields) != 6:
-        reasons.append("missing required fields")
-        return False, None, f"Line {line_no}: {original_line} \u2192 {', '.join(reasons)}"
-
-    flight_id, origin, destination, dep_str, arr_str, price_str = (f.strip() for f in fields)
+        return False, None, reasons_message(line_no, original_line, REASON_FIELD_COUNT)
 
-    # Flight ID
-    if not flight_id:
-        reasons.append("missing flight_id field")
-    elif not is_valid_flight_id(flight_id):
-        if len(flight_id) > 8:
-            reasons.append("flight_id too long (more than 8 characters)")
-        else:
-            reasons.append("invalid flight_id format")
-
-    # Origin
-    if not origin:
-        reasons.append("missing origin field")
-    elif not is_valid_airport_code(origin):
-        reasons.append("invalid origin code")
+    flight_id = fields[0].strip()
+    origin = fields[1].strip()
+    destination = fields[2].strip()
+    dep_str = fields[3].strip()
+    arr_str = fields[4].strip()
+    price_str = fields[5].strip()
 
-    # Destination
-    if not destination:
-        reasons.append("missing destination field")
-    elif not is_valid_airport_code(destination):
-        reasons.append("invalid destination code")
+    # Flight ID / origin / destination
+    reasons_bits = check_codes(flight_id, origin, destination)
 
     # Datetimes
     dep_dt = parse_datetime(dep_str)
     arr_dt = parse_datetime(arr_str)
 
     if dep_dt is None and arr_dt is None:
-        reasons.append("invalid date format")
+        reasons_bits |= REASON_DATE_FORMAT
     else:
         if dep_dt is None:
-            reasons.append("invalid departure datetime")
+            reasons_bits |= REASON_DEP_DATETIME
         if arr_dt is None:
-            reasons.append("invalid arrival datetime")
+            reasons_bits |= REASON_ARR_DATETIME
 
     # Arrival after departure
     if dep_dt is not None and arr_dt is not None:
         if arr_dt <= dep_dt:
-            reasons.append("arrival before departure")
+            reasons_bits |= REASON_ARR_BEFORE_DEP
 
     # Price
     price = parse_price(price_str)
     if price is None:
-        reasons.append("invalid price value")
+        reasons_bits |= REASON_PRICE_VALUE
     else:
         if price < 0:
-            reasons.append("negative price value")
+            reasons_bits |= REASON_PRICE_NEGATIVE
         elif price == 0:
-            reasons.append("price must be positive")
-
-    if reasons:
-        return False, None, f"Line {line_no}: {original_line} \u2192 {', '.join(reasons)}"
-
-    # Construct valid flight dict
-    flight = {
-        "flight_id": flight_id,
-        "origin": origin,
-        "destination": destination,
-        "departure_datetime": dep_str,
-        "arrival_datetime": arr_str,
-        "price": price,
-    }
+            reasons_bits |= REASON_PRICE_ZERO
+
+    if reasons_bits:
+        return False, None, reasons_message(line_no, original_line, reasons_bits)
+
+    # Construct valid flight
+    # (codes are interned: repeated values share one string object)
+    flight = Flight(
+        flight_id=sys.intern(flight_id),
+        origin=sys.intern(origin),
+        destination=sys.intern(destination),
+        departure_datetime=dep_str,
+        arrival_datetime=arr_str,
+        price=price,
+        dep_dt=dep_dt,
+        arr_dt=arr_dt,
+    )
     return True, flight, ""
 
-#Parse a single CSV file, write errors to ERRORS_TXT, and return list of valid flights.
+#Header / comment line helpers for parse_csv_file
+
+CSV_HEADER_PREFIX = "flight_id,origin,destination"
+
 
-def parse_csv_file(path: str) -> List[Dict[str, Any]]:
+def comment_error(line_no: int, original_line: str) -> str:
+    return f"Line {line_no}: {original_line} \u2192 comment line, ignored for data parsing\n"
 
-    valid_flights: List[Dict[str, Any]] = []
+#Parse a single CSV file and return (valid flights, error lines ending in "\n").
+#Errors are collected rather than written so files can be parsed in worker processes.
 
-    with open(path, "r", encoding="utf-8") as f, open(ERRORS_TXT, "a", encoding="utf-8") as err_f:
-        reader = f.readlines()
+def parse_csv_file(path: str) -> Tuple[List[Flight], List[str]]:
 
-        header_skipped = False
-        for line_no, raw_line in enumerate(reader, start=1):
+    valid_flights: List[Flight] = []
+    errors: List[str] = []
+
+    # Iterate the file lazily with a large read buffer instead of readlines()
+    with open(path, "r", encoding="utf-8", buffering=READ_BUFFER_SIZE) as f:
+        lines: Iterator[Tuple[int, str]] = enumerate(f, start=1)
+
+        # Header: only looked for before the first data line (blank and comment
+        # lines may come first); if the first data line is not a header, it is
+        # put back so the main loop parses it as data
+        for line_no, raw_line in lines:
+            stripped = raw_line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith("#"):
+                errors.append(comment_error(line_no, raw_line.rstrip("\n")))
+                continue
+            if not stripped.lower().startswith(CSV_HEADER_PREFIX):
+                lines = chain([(line_no, raw_line)], lines)
+            break
+
+        for line_no, raw_line in lines:
             original_line = raw_line.rstrip("\n")
 
             stripped = original_line.strip()
@@ -148,149 +316,317 @@ def parse_csv_file(path: str) -> List[Dict[str, Any]]:
                 # blank line -> ignore completely
                 continue
 
-            # Header
-            if not header_skipped and stripped.lower().startswith("flight_id,origin,destination"):
-                header_skipped = True
-                continue
-
             # Comment lines
             if stripped.startswith("#"):
-                msg = f"Line {line_no}: {original_line} \u2192 comment line, ignored for data parsing"
-                err_f.write(msg + "\n")
+                errors.append(comment_error(line_no, original_line))
                 continue
 
             # Normal data line
-            # Use csv.reader on a single line to be safe
-            for fields in csv.reader([original_line]):
-                is_valid, flight, error_msg = validate_row(fields, line_no, original_line)
-                if is_valid and flight is not None:
-                    valid_flights.append(flight)
-                else:
-                    err_f.write(error_msg + "\n")
+            # Plain split unless the line has quotes, then let csv handle them
+            if '"' in original_line:
+                fields = next(csv.reader([original_line]))
+            else:
+                fields = original_line.split(",")
+            is_valid, flight, error_msg = validate_row(fields, line_no, original_line)
+            if is_valid and flight is not None:
+                valid_flights.append(flight)
+            else:
+                errors.append(error_msg + "\n")
+
+    return valid_flights, errors
 
-    return valid_flights
+#Write error lines to ERRORS_TXT in one call (replacing any previous run's file).
+
+def write_errors(errors: List[str]) -> None:
+    with open(ERRORS_TXT, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as err_f:
+        err_f.writelines(errors)
 
 #Parse all .csv files in a folder and combine results.
+#Files are parsed in parallel worker processes; results are merged in file order.
 
-def parse_csv_folder(folder_path: str) -> List[Dict[str, Any]]:
+def parse_csv_folder(folder_path: str) -> List[Flight]:
     
-    all_flights: List[Dict[str, Any]] = []
+    all_flights: List[Flight] = []
+    all_errors: List[str] = []
 
-    # Clear/overwrite previous errors.txt
+    # Clear previous errors.txt so a failed run doesn't leave stale errors behind
     if os.path.exists(ERRORS_TXT):
         os.remove(ERRORS_TXT)
 
-    csv_files = [
-        os.path.join(folder_path, name)
-        for name in os.listdir(folder_path)
-        if name.lower().endswith(".csv")
-    ]
-    csv_files.sort()
+    with os.scandir(folder_path) as entries:
+        csv_files = sorted(
+            entry.path
+            for entry in entries
+            if entry.name.lower().endswith(".csv") and entry.is_file()
+        )
+
+    if len(csv_files) > 1:
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(parse_csv_file, csv_files))
+        # Strings pickled back from workers are fresh copies: intern them again
+        # so equal codes from different files share one object
+        for flights, _ in results:
+            for flight in flights:
+                flight.flight_id = sys.intern(flight.flight_id)
+                flight.origin = sys.intern(flight.origin)
+                flight.destination = sys.intern(flight.destination)
+    else:
+        results = [parse_csv_file(path) for path in csv_files]
 
-    for path in csv_files:
-        flights = parse_csv_file(path)
+    for flights, errors in results:
         all_flights.extend(flights)
+        all_errors.extend(errors)
 
+    write_errors(all_errors)
     return all_flights
 
-#Parse a single CSV file (helper so we can clear errors.txt first).
+#Parse a single CSV file (clearing errors.txt first) and write its errors.
 
-def parse_single_csv(path: str) -> List[Dict[str, Any]]:
+def parse_single_csv(path: str) -> List[Flight]:
 
     if os.path.exists(ERRORS_TXT):
         os.remove(ERRORS_TXT)
-    return parse_csv_file(path)
+    flights, errors = parse_csv_file(path)
+    write_errors(errors)
+    return flights
+
+#  JSON READ / WRITE HELPERS (orjson if installed, stdlib json otherwise)
+
+def read_json(path: str) -> Any:
+    if orjson is not None:
+        with open(path, "rb") as f:
+            raw = f.read()
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # stdlib json also accepts NaN/Infinity, which older DB files may contain
+            return json.loads(raw.decode("utf-8"))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(data: Any, path: str) -> None:
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+#Write a JSON array one element at a time, so the whole array never has to be
+#in memory. The output is laid out exactly like write_json would do it.
+#Items are written to "<path>.tmp" and moved into place only once all of them
+#were produced, so a failure part-way never leaves a truncated file at path.
+
+def write_json_array(items: Iterable[Any], path: str) -> None:
+    tmp_path = path + ".tmp"
+    try:
+        if orjson is not None:
+            with open(tmp_path, "wb") as f:
+                first = True
+                for item in items:
+                    f.write(b"[\n  " if first else b",\n  ")
+                    f.write(orjson.dumps(item, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).replace(b"\n", b"\n  "))
+                    first = False
+                f.write(b"[]" if first else b"\n]")
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                first = True
+                for item in items:
+                    f.write("[\n  " if first else ",\n  ")
+                    f.write(json.dumps(item, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                    first = False
+                f.write("[]" if first else "\n]")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+#  JSON STRUCTURE CHECKS
+#  Run once per loaded file so the query code can trust every field it reads.
+
+STRING_FIELDS = ("flight_id", "origin", "destination")
+DATETIME_FIELDS = ("departure_datetime", "arrival_datetime")
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_flight_record(item: Any, index: int) -> None:
+    if not isinstance(item, dict):
+        raise ValueError(f"flight #{index} must be an object")
+    for key in STRING_FIELDS + DATETIME_FIELDS + ("price",):
+        if key not in item:
+            raise ValueError(f"flight #{index} is missing '{key}'")
+    for key in STRING_FIELDS:
+        if not isinstance(item[key], str):
+            raise ValueError(f"flight #{index}: '{key}' must be a string")
+    for key, cache_key in zip(DATETIME_FIELDS, ("_dep_epoch_min", "_arr_epoch_min")):
+        if not isinstance(item[key], str) or parse_datetime(item[key]) is None:
+            raise ValueError(f"flight #{index}: '{key}' must use format YYYY-MM-DD HH:MM")
+        if cache_key in item and (not isinstance(item[cache_key], int) or isinstance(item[cache_key], bool)):
+            raise ValueError(f"flight #{index}: '{cache_key}' must be an integer")
+    if not is_number(item["price"]):
+        raise ValueError(f"flight #{index}: 'price' must be a number")
+
+
+def check_query(item: Any, index: int) -> None:
+    # Only the structure is checked here: a query with a bad value still gets
+    # a response, it just matches nothing (see prepare_query)
+    if not isinstance(item, dict):
+        raise ValueError(f"query #{index} must be an object")
 
 #  JSON DB LOAD / SAVE
 
-def save_db_json(flights: List[Dict[str, Any]], output_path: str) -> None:
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(flights, f, indent=2, ensure_ascii=False)
+def save_db_json(flights: List[Flight], output_path: str) -> None:
+    write_json([flight.to_db_dict() for flight in flights], output_path)
 
 
-def load_db_json(path: str) -> List[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def load_db_json(path: str) -> List[Flight]:
+    data = read_json(path)
     if not isinstance(data, list):
         raise ValueError("JSON database must be a list of flight objects")
-    return data
+    flights: List[Flight] = []
+    for index, item in enumerate(data, start=1):
+        check_flight_record(item, index)
+        flights.append(Flight.from_dict(item))
+    return flights
 
 
 #  QUERY HANDLING
 
 def load_queries(path: str) -> List[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = read_json(path)
     if isinstance(data, dict):
-        return [data]
-    if isinstance(data, list):
-        return data
-    raise ValueError("Query JSON must be an object or an array of objects")
+        data = [data]
+    elif not isinstance(data, list):
+        raise ValueError("Query JSON must be an object or an array of objects")
+    for index, item in enumerate(data, start=1):
+        check_query(item, index)
+    return data
+
+#Exact-match indexes: value -> flights (in DB order) for flight_id, origin, destination.
+
+def build_indexes(flights: List[Flight]) -> Dict[str, Dict[str, List[Flight]]]:
+    indexes: Dict[str, Dict[str, List[Flight]]] = {key: {} for key in STRING_FIELDS}
+    for flight in flights:
+        for key in STRING_FIELDS:
+            indexes[key].setdefault(getattr(flight, key), []).append(flight)
+    return indexes
+
+#Turn a query into its comparison operands once (datetimes parsed, price as float).
+#Only the filters present in the query are kept, always in QUERY_FIELDS order.
+#Returns None if a datetime or the price cannot be parsed: such a query matches nothing.
+
+QUERY_FIELDS = STRING_FIELDS + DATETIME_FIELDS + ("price",)
+
+
+def prepare_query(query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    prepped: Dict[str, Any] = {}
+    for key in QUERY_FIELDS:
+        if key not in query:
+            continue
+        value = query[key]
+        if key in STRING_FIELDS:
+            prepped[key] = sys.intern(str(value))
+        elif key in DATETIME_FIELDS:
+            dt = parse_datetime(value) if isinstance(value, str) else None
+            if dt is None:
+                return None
+            prepped[key] = dt
+        else:
+            try:
+                prepped[key] = float(value)
+            except (TypeError, ValueError):
+                return None
+    return prepped
+
+#Generated scanners: for each query shape (the set of filters present) build a
+#function with just those comparisons, e.g. for {"origin", "price"}:
+#    def scan(flights, origin, price):
+#        return [f for f in flights if f.origin == origin and f.price <= price]
+#Only the fixed names in FILTER_EXPRS go into the source; query values are
+#passed in as arguments, so one scanner serves every query of the same shape.
+
+FILTER_EXPRS = {
+    "flight_id": "f.flight_id == flight_id",
+    "origin": "f.origin == origin",
+    "destination": "f.destination == destination",
+    "departure_datetime": "f.dep_dt >= departure_datetime",
+    "arrival_datetime": "f.arr_dt <= arrival_datetime",
+    "price": "f.price <= price",
+}
+
+_scanners: Dict[Tuple[str, ...], Callable[..., List[Flight]]] = {}
+
+
+def compile_scanner(shape: Tuple[str, ...]) -> Callable[..., List[Flight]]:
+    scanner = _scanners.get(shape)
+    if scanner is None:
+        params = ", ".join(("flights",) + shape)
+        if shape:
+            body = "[f for f in flights if " + " and ".join(FILTER_EXPRS[key] for key in shape) + "]"
+        else:
+            body = "list(flights)"
+        namespace: Dict[str, Any] = {}
+        exec(compile(f"def scan({params}):\n    return {body}\n", "<scanner>", "exec"), namespace)
+        scanner = _scanners[shape] = namespace["scan"]
+    return scanner
 
-#Apply filtering rules
+#Apply filtering rules: start from the smallest index bucket among the exact-match
+#fields in the query (or the whole DB), then run the scanner for the query's shape.
+
+def matching_flights(flights: List[Flight], indexes: Dict[str, Dict[str, List[Flight]]],
+                     prepped: Optional[Dict[str, Any]]) -> List[Flight]:
+    if prepped is None:
+        return []
+    candidates = flights
+    pinned = [key for key in STRING_FIELDS if key in prepped]
+    if pinned:
+        candidates = min((indexes[key].get(prepped[key], []) for key in pinned), key=len)
+    return compile_scanner(tuple(prepped))(candidates, **prepped)
 
-def flight_matches_query(flight: Dict[str, Any], query: Dict[str, Any]) -> bool:
-    
-    # Exact matches
-    for key in ("flight_id", "origin", "destination"):
-        if key in query:
-            if str(flight.get(key)) != str(query[key]):
-                return False
-
-    # Date/time filters
-    if "departure_datetime" in query:
-        q_dep = parse_datetime(query["departure_datetime"])
-        if q_dep is None:
-            return False
-        f_dep = parse_datetime(flight["departure_datetime"])
-        if f_dep is None or f_dep < q_dep:
-            return False
-
-    if "arrival_datetime" in query:
-        q_arr = parse_datetime(query["arrival_datetime"])
-        if q_arr is None:
-            return False
-        f_arr = parse_datetime(flight["arrival_datetime"])
-        if f_arr is None or f_arr > q_arr:
-            return False
-
-    # Price filter
-    if "price" in query:
-        try:
-            q_price = float(query["price"])
-        except (TypeError, ValueError):
-            return False
-        if float(flight["price"]) > q_price:
-            return False
 
-    return True
+#Raised (lazily, while responses are being written) when evaluating a query fails,
+#so main can tell it apart from an error writing the response file.
 
+class QueryError(Exception):
+    pass
 
-def run_queries_on_db(flights: List[Dict[str, Any]], queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+
+def run_queries_on_db(flights: List[Flight], queries: List[Dict[str, Any]],
+                      indexes: Optional[Dict[str, Dict[str, List[Flight]]]] = None) -> Iterator[Dict[str, Any]]:
     """
-    For each query, produce:
+    For each query, yield (one at a time, as they are computed):
     {
         "query": { ... },
         "matches": [ flight1, flight2, ... ]
     }
     """
-    responses = []
-    for q in queries:
-        matches = [flight for flight in flights if flight_matches_query(flight, q)]
-        responses.append({
+    if indexes is None:
+        indexes = build_indexes(flights)
+    for index, q in enumerate(queries, start=1):
+        try:
+            matches = matching_flights(flights, indexes, prepare_query(q))
+        except Exception as e:
+            raise QueryError(f"query #{index}: {e}") from e
+        yield {
             "query": q,
             "matches": matches
-        })
-    return responses
+        }
 
 #Save responses to response_<studentid>_<name>_<lastname>_<YYYYMMDD_HHMM>.json. Returns the filename
 
-def save_query_response(responses: List[Dict[str, Any]]) -> str:
+def save_query_response(responses: Iterable[Dict[str, Any]]) -> str:
     
     now = datetime.now()
     filename = f"response_{STUDENT_ID}_{STUDENT_NAME}_{STUDENT_LASTNAME}_{now.strftime('%Y%m%d_%H%M')}.json"
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(responses, f, indent=2, ensure_ascii=False)
+    write_json_array((
+        {"query": r["query"], "matches": [flight.to_dict() for flight in r["matches"]]}
+        for r in responses
+    ), filename)
     return filename
 
 #  CLI / MAIN
@@ -327,7 +663,7 @@ def main() -> None:
     args = parser.parse_args()
 
     # Decide how to get the database: CSV parse or JSON load
-    flights_db: List[Dict[str, Any]] = []
+    flights_db: List[Flight] = []
 
     # If JSON DB is provided, use that instead of parsing CSVs
     if args.json_db:
@@ -379,6 +715,9 @@ def main() -> None:
         try:
             response_file = save_query_response(responses)
             print(f"Query responses saved to '{response_file}'.")
+        except QueryError as e:
+            print(f"Error running queries: {e}")
+            return
         except Exception as e:
             print(f"Error saving query response file: {e}")
             return